@@ -0,0 +1,189 @@
+"""
+Offline build of optimized stimulus folders.
+
+Every stimulus from images/<block>/<with|without>_numbers is hashed, deduplicated, converted to a plain
+RGB/RGBA image, downscaled to fit the target display resolution and saved as a recompressed PNG.
+Files that differ only in extension case (1.PNG and 1.png) are treated as variants of one item and only one
+of them is kept (see --variant), so the experiment built from the output has half as many trials as
+one loading both variants from images/.
+Work is spread over a process pool. Problems (duplicated variants, missing pairs, with-numbers and
+without-numbers images of different sizes) are printed and saved to build_report.txt in the output folder.
+
+Usage:
+    python build_assets.py --width 1920 --height 1080
+and then set stimulus_dir: images_optimized in config.yaml.
+"""
+import argparse
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join
+
+from PIL import Image
+
+BLOCKS = ("training", "experiment")
+VERSIONS = ("without_numbers", "with_numbers")
+EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def inspect_image(path):
+    """
+    Method that hash an image and read its size.
+    :param path: path to image
+    :return: dict with path, sha256 of file content, (width, height) and file size in bytes
+    """
+    with open(path, 'rb') as image_file:
+        content = image_file.read()
+    with Image.open(path) as image:
+        size = image.size
+    return {"path": path, "hash": hashlib.sha256(content).hexdigest(), "size": size, "bytes": len(content)}
+
+
+def optimize_image(src, dst, width, height):
+    """
+    Method that normalize image mode, downscale it to fit (width, height) and save it as optimized PNG.
+    :param src: source image path
+    :param dst: output image path
+    :param width: target display width
+    :param height: target display height
+    :return: (src, dst, new size)
+    """
+    with Image.open(src) as image:
+        image = image.convert("RGBA")
+    if image.getextrema()[3] == (255, 255):  # alpha not used
+        image = image.convert("RGB")
+    if image.width > width or image.height > height:
+        image.thumbnail((width, height), Image.LANCZOS)
+    image.save(dst, format="PNG", optimize=True)
+    return src, dst, image.size
+
+
+def collect_images(src_dir):
+    paths = []
+    for block_type in BLOCKS:
+        for version in VERSIONS:
+            folder = join(src_dir, block_type, version)
+            paths.extend(join(folder, name) for name in sorted(os.listdir(folder))
+                         if os.path.splitext(name)[1].lower() in EXTENSIONS)
+    return paths
+
+
+def choose_sources(infos, problems, variant="largest"):
+    """
+    Method that pick one source file per item. Variants of the same item differing only in extension case
+    (e.g. 1.PNG and 1.png) are merged.
+    :param infos: list of inspect_image results
+    :param problems: list to which problems are appended
+    :param variant: which variant is kept: largest (highest resolution), smallest (lowest resolution)
+                    or an exact extension, e.g. .png (falls back to largest if item has no such file)
+    :return: OrderedDict (block_type, version, item) -> chosen info
+    """
+    variants = OrderedDict()
+    for info in infos:
+        folder, name = os.path.split(info["path"])
+        folder, version = os.path.split(folder)
+        block_type = os.path.basename(folder)
+        item = os.path.splitext(name)[0]
+        variants.setdefault((block_type, version, item), []).append(info)
+
+    sources = OrderedDict()
+    for key, item_variants in variants.items():
+        item_variants.sort(key=lambda x: (x["size"][0] * x["size"][1], x["bytes"]), reverse=True)
+        if variant == "smallest":
+            item_variants.reverse()
+        elif variant != "largest":
+            item_variants.sort(key=lambda x: os.path.splitext(x["path"])[1] != variant)
+        best = item_variants[0]
+        for other in item_variants[1:]:
+            if other["hash"] == best["hash"]:
+                problems.append(f"Duplicate: {other['path']} is identical to {best['path']}")
+            else:
+                problems.append(f"Variant: {other['path']} {other['size']} dropped in favour of "
+                                f"{best['path']} {best['size']}")
+        sources[key] = best
+    return sources
+
+
+def check_pairs(sizes, problems):
+    """
+    Method that check if every item has both versions, and if both versions have the same size.
+    :param sizes: dict (block_type, version, item) -> (width, height)
+    :param problems: list to which problems are appended
+    """
+    items = OrderedDict((key[0::2], None) for key in sizes)
+    for block_type, item in items:
+        no_numbers = sizes.get((block_type, VERSIONS[0], item))
+        with_numbers = sizes.get((block_type, VERSIONS[1], item))
+        if no_numbers is None or with_numbers is None:
+            missing = VERSIONS[0] if no_numbers is None else VERSIONS[1]
+            problems.append(f"Missing pair: {block_type}/{item} has no {missing} version")
+        elif no_numbers != with_numbers:
+            problems.append(f"Size mismatch: {block_type}/{item} {VERSIONS[0]} {no_numbers} "
+                            f"vs {VERSIONS[1]} {with_numbers}")
+
+
+def build(src_dir, out_dir, width, height, workers=None, variant="largest"):
+    if os.path.abspath(out_dir) == os.path.abspath(src_dir):
+        raise Exception("Output folder must be different from source folder")
+    problems = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        infos = list(executor.map(inspect_image, collect_images(src_dir)))
+        sources = choose_sources(infos, problems, variant=variant)
+        check_pairs({key: info["size"] for key, info in sources.items()}, problems)
+
+        # sources are readable, so the previous build can go; stale items would be loaded by the experiment
+        for block_type in BLOCKS:
+            for version in VERSIONS:
+                folder = join(out_dir, block_type, version)
+                if os.path.isdir(folder):
+                    shutil.rmtree(folder)
+                os.makedirs(folder)
+
+        # identical content is processed only once and copied to other destinations
+        destinations = OrderedDict()
+        for (block_type, version, item), info in sources.items():
+            dst = join(out_dir, block_type, version, item + ".png")
+            destinations.setdefault(info["hash"], (info["path"], []))[1].append(dst)
+        futures = [executor.submit(optimize_image, src, dsts[0], width, height)
+                   for src, dsts in destinations.values()]
+        for future in futures:
+            future.result()
+
+    for _, dsts in destinations.values():
+        for dst in dsts[1:]:
+            shutil.copyfile(dsts[0], dst)
+            problems.append(f"Duplicate: {dst} has the same content as {dsts[0]}, copied")
+
+    bytes_before = sum(info["bytes"] for info in infos)
+    bytes_after = sum(os.path.getsize(dst) for _, dsts in destinations.values() for dst in dsts)
+    summary = [f"Source images: {len(infos)}, output images: {len(sources)}, unique: {len(destinations)}",
+               f"Target resolution: {width}x{height}, variant kept: {variant}",
+               f"Size: {bytes_before / 1024:.0f} KiB -> {bytes_after / 1024:.0f} KiB"]
+    with open(join(out_dir, "build_report.txt"), 'w', encoding='utf8') as report_file:
+        report_file.writelines(line + "\n" for line in summary + problems)
+    return summary, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build optimized stimulus folders for the experiment.")
+    parser.add_argument("--src", default="images", help="folder with training and experiment stimuli")
+    parser.add_argument("--out", default="images_optimized", help="output folder (stimulus_dir in config.yaml)")
+    parser.add_argument("--width", type=int, default=1920, help="target display width")
+    parser.add_argument("--height", type=int, default=1080, help="target display height")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, default: all cpus")
+    parser.add_argument("--variant", default="largest",
+                        help="which of 1.PNG/1.png variants is kept: largest (highest resolution), smallest "
+                             "or an exact extension, e.g. .png")
+    args = parser.parse_args()
+
+    summary, problems = build(args.src, args.out, args.width, args.height, workers=args.workers,
+                               variant=args.variant)
+    for line in summary + problems:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
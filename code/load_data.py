@@ -37,15 +37,18 @@ def read_text_from_file(file_name, insert=''):
     return ''.join(msg)
 
 
-def load_images(randomize):
+def load_images(randomize, stimulus_dir):
     def my_digit_sort(my_list):
-        return list(map(int, re.findall(r'\d+', my_list)))[0]
+        return list(map(int, re.findall(r'\d+', my_list)))[0], my_list
 
-    training_images_no_numbers = os.listdir(os.path.join("images", "training", "without_numbers"))
-    training_images_with_numbers = os.listdir(os.path.join("images", "training", "with_numbers"))
+    training_images_no_numbers = os.listdir(os.path.join(stimulus_dir, "training", "without_numbers"))
+    training_images_with_numbers = os.listdir(os.path.join(stimulus_dir, "training", "with_numbers"))
+    # os.listdir order depends on filesystem, so both lists are sorted before pairing
+    training_images_no_numbers.sort()
+    training_images_with_numbers.sort()
     training_images = list(zip(training_images_no_numbers, training_images_with_numbers))
-    experimental_images_no_numbers = os.listdir(os.path.join("images", "experiment", "without_numbers"))
-    experimental_images_with_numbers = os.listdir(os.path.join("images", "experiment", "with_numbers"))
+    experimental_images_no_numbers = os.listdir(os.path.join(stimulus_dir, "experiment", "without_numbers"))
+    experimental_images_with_numbers = os.listdir(os.path.join(stimulus_dir, "experiment", "with_numbers"))
 
     experimental_images_no_numbers.sort(key=my_digit_sort)
     experimental_images_with_numbers.sort(key=my_digit_sort)
@@ -59,12 +62,13 @@ def load_images(randomize):
     return training_images, experimental_images
 
 
-def prepare_block_stimulus(images, win, config, folder):
+def prepare_block_stimulus(images, win, config, folder, stimulus_dir):
     result = []
+    folder = os.path.join(stimulus_dir, folder)
     for (image1, image2) in images:
-        stim1 = visual.image.ImageStim(win=win, image=os.path.join("images", folder, "without_numbers", image1),
+        stim1 = visual.image.ImageStim(win=win, image=os.path.join(folder, "without_numbers", image1),
                                        pos=config["stimulus_pos"], interpolate=True)
-        stim2 = visual.image.ImageStim(win=win, image=os.path.join("images", folder, "with_numbers", image2),
+        stim2 = visual.image.ImageStim(win=win, image=os.path.join(folder, "with_numbers", image2),
                                        pos=config["stimulus_pos"], interpolate=True)
         if image1.find("_") != -1:
             image_id = int(image1.split("_")[0])
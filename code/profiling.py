@@ -0,0 +1,147 @@
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+from os.path import join
+
+from psychopy import logging
+
+BLOCK_TYPES = ("training", "experiment")
+PHASES = ("fixation", "stimulus", "answer", "feedback", "wait")
+
+
+def check_profiling_config(config):
+    """
+    Check profiling switches before the procedure starts. Unknown block and phase names are rejected, so a typo
+    doesn't silently profile nothing. tracemalloc slows down every allocation, so a block can't be timed with
+    cProfile and traced with tracemalloc at the same time.
+    Args:
+        config: Loaded config.yaml.
+    """
+    for key, allowed in (("profile_blocks", BLOCK_TYPES), ("profile_memory_blocks", BLOCK_TYPES),
+                         ("profile_phases", PHASES)):
+        unknown = [name for name in (config.get(key) or []) if name not in allowed]
+        if unknown:
+            raise Exception(f"Unknown names {unknown} in {key}. Choose from: {', '.join(allowed)}")
+    both = set(config.get("profile_blocks") or []) & set(config.get("profile_memory_blocks") or [])
+    if both:
+        raise Exception(f"Blocks {sorted(both)} are in both profile_blocks and profile_memory_blocks. "
+                        f"Choose one, tracemalloc inflates cProfile timings.")
+
+
+class _NoProfiling(object):
+    """
+    Reusable do-nothing context manager, so disabled hooks cost one method call per phase.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_PROFILING = _NoProfiling()
+
+
+class BlockProfiler(object):
+    """
+    Class that wraps one block of the procedure with cProfile and tracemalloc, according to config.yaml switches.
+    Usage:
+
+    with BlockProfiler(config, block_type, session_name) as profiler:
+        block(..., profiler=profiler)
+
+    and inside a block:
+    with profiler.phase('answer'):
+        ...
+
+    Only cProfile can be limited to trial phases listed in profile_phases. tracemalloc always traces the whole
+    block and ignores profile_phases. The same block can't be in both profile_blocks and profile_memory_blocks
+    (see check_profiling_config).
+
+    Results are saved to the results folder next to beh<session_name>.csv as
+    profile<session_name>_<block_type>.prof (cProfile dump, readable with pstats or snakeviz) and
+    memory<session_name>_<block_type>.txt (tracemalloc diff).
+    """
+
+    def __init__(self, config, block_type, session_name, results_dir='results'):
+        """
+        Args:
+            config: Loaded config.yaml.
+            block_type: Name of the block, e.g. training or experiment.
+            session_name: Suffix shared with beh and triggermap files of the session, e.g. _M_20_481.
+            results_dir: Folder for profile dumps and memory reports.
+        """
+        self.block_type = block_type
+        self.cpu = block_type in (config.get("profile_blocks") or [])
+        self.memory = block_type in (config.get("profile_memory_blocks") or [])
+        self.phases = config.get("profile_phases") or []
+        self.memory_top = config.get("profile_memory_top", 30)
+        self.file_name = f'{session_name}_{block_type}'
+        self.results_dir = results_dir
+        self._profile = cProfile.Profile() if self.cpu else None
+        self._snapshot = None
+        self._stop_tracing = False
+
+    def __enter__(self):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._stop_tracing = True
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.cpu and not self.phases:  # no phases chosen, so whole block is profiled
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Runs also when experiment is finished by user (SystemExit), so partial results are kept.
+        if self.cpu:
+            self._profile.disable()
+            self._save_profile()
+        if self.memory:
+            self._save_memory_diff(tracemalloc.take_snapshot())
+            if self._stop_tracing:
+                tracemalloc.stop()
+        return False
+
+    def phase(self, name):
+        """
+        Context manager for a single trial phase. Profiles it only if it's listed in profile_phases.
+        Args:
+            name: Phase name: fixation, stimulus, answer, feedback or wait.
+
+        Returns:
+            Context manager.
+        """
+        if self.cpu and name in self.phases:
+            return self._profiled_phase()
+        return _NO_PROFILING
+
+    @contextmanager
+    def _profiled_phase(self):
+        self._profile.enable()
+        try:
+            yield self
+        finally:
+            self._profile.disable()
+
+    def _save_profile(self):
+        if not self._profile.getstats():  # e.g. only phases that never ran were chosen, dump couldn't be opened
+            logging.warning(f'Nothing was profiled in block {self.block_type} (phases: {self.phases}), '
+                            f'profile not saved.')
+            return
+        file_name = join(self.results_dir, 'profile' + self.file_name + '.prof')
+        self._profile.dump_stats(file_name)
+        logging.info(f'Profile of block {self.block_type} saved to {file_name}')
+
+    def _save_memory_diff(self, snapshot):
+        file_name = join(self.results_dir, 'memory' + self.file_name + '.txt')
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        stats = snapshot.compare_to(self._snapshot, 'lineno')
+        with open(file_name, 'w') as memory_file:
+            memory_file.write(f'# Block: {self.block_type}\n')
+            memory_file.write(f'# Total size difference: {sum(stat.size_diff for stat in stats) / 1024:.1f} KiB\n')
+            for stat in stats[:self.memory_top]:
+                memory_file.write(f'{stat}\n')
+        logging.info(f'Allocation diff of block {self.block_type} saved to {file_name}')
+
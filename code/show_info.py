@@ -2,13 +2,15 @@ from code.load_data import read_text_from_file
 from psychopy import visual, gui, event
 
 
-def part_info(test=False):
+def part_info(test=False, exit_on_cancel=True):
     if test:
         info = {'Kod badanego': '', 'Wiek': '20', 'Płeć': 'M'}
     else:
         info = {'Kod badanego': '', 'Wiek': '', 'Płeć': ['M', "K"]}
         dict_dlg = gui.DlgFromDict(dictionary=info, title='Graph_special')
         if not dict_dlg.OK:
+            if not exit_on_cancel:
+                return None
             exit(1)
     info = {'Part_id': info['Kod badanego'],
             'Part_age': info["Wiek"],
@@ -16,6 +18,25 @@ def part_info(test=False):
     return info, f"{info['Part_id']}_{info['Part_sex']}_{info['Part_age']}"
 
 
+def next_part_info(win):
+    """
+    Ask for the next participant info while keeping the experiment window open (kiosk mode).
+    Fullscreen window is minimized, so dialog isn't hidden behind it.
+    Returns None if dialog was cancelled, which ends kiosk mode.
+    """
+    win.winHandle.set_fullscreen(False)
+    win.winHandle.minimize()
+    win.flip()
+    info = part_info(exit_on_cancel=False)
+    if info is None:
+        return None
+    win.winHandle.maximize()
+    win.winHandle.set_fullscreen(True)
+    win.winHandle.activate()
+    win.flip()
+    return info
+
+
 def show_info(win, file_name, text_size, text_color, screen_res, insert=''):
     msg = read_text_from_file(file_name, insert=insert)
     msg = visual.TextStim(win, color=text_color, text=msg, height=text_size, wrapWidth=screen_res['width'])
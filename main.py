@@ -4,17 +4,18 @@ import random
 import time
 from os.path import join
 import pandas as pd
-from psychopy import visual, event, core
+from psychopy import visual, event, core, logging
 import string
 
 from code.load_data import load_config, load_images, prepare_block_stimulus
 from code.screen_misc import get_screen_res
-from code.show_info import part_info, show_info
+from code.show_info import part_info, next_part_info, show_info
 from code.check_exit import check_exit
 from code.triggers import TriggerHandler
+from code.profiling import BlockProfiler, check_profiling_config
 
 RESULTS = []
-PART_ID = ""
+SESSION_NAME = ""
 
 
 class TriggerTypes(object):
@@ -27,18 +28,34 @@ class TriggerTypes(object):
         return [value for name, value in vars(cls).items() if name.isupper()]
 
 
-TRIGGERS = TriggerHandler(TriggerTypes.vals(), trigger_params=['corr', 'trial_type', 'block_type'], trigger_time=0.003)
+def create_triggers():
+    return TriggerHandler(TriggerTypes.vals(), trigger_params=['corr', 'trial_type', 'block_type'], trigger_time=0.003)
+
+
+TRIGGERS = create_triggers()
+
+
+def new_session(part_id):
+    """
+    Reset results and trigger state for a new participant, so window and stimuli can be reused (kiosk mode).
+    """
+    global RESULTS, SESSION_NAME, TRIGGERS
+    RESULTS = []
+    SESSION_NAME = f'_{part_id}_{random.randint(100, 999)}'  # shared by beh, triggermap and profiling files
+    TRIGGERS = create_triggers()
 
 
 @atexit.register
 def save_beh_results():
-    num = random.randint(100, 999)
-    file_name = f'_{PART_ID}_{num}.csv'
+    if not RESULTS:  # nothing collected or session already saved
+        return
+    file_name = f'{SESSION_NAME}.csv'
     with open(join('results', "beh" + file_name), 'w', newline='') as beh_file:
         dict_writer = csv.DictWriter(beh_file, RESULTS[0].keys())
         dict_writer.writeheader()
         dict_writer.writerows(RESULTS)
     TRIGGERS.save_to_file(join('results', 'triggermap' + file_name))
+    RESULTS.clear()
 
 
 def draw_stim_list(stim_list, flag):
@@ -70,7 +87,7 @@ def show_timer(timer, clock, config):
 
 
 def block(config, images, block_type, win, fixation, clock, screen_res, answers, answers_buttons, mouse, feedback,
-          extra_text, clock_image, timer):
+          extra_text, clock_image, timer, profiler):
     show_info(win, join('.', 'messages', f'instruction_{block_type}.txt'), text_color=config["text_color"],
               text_size=config["text_size"], screen_res=screen_res)
 
@@ -89,86 +106,89 @@ def block(config, images, block_type, win, fixation, clock, screen_res, answers,
 
         # fixation
         if config["fixation_time"] > 0:
-            show_stim(fixation, config["fixation_time"], clock, win)
+            with profiler.phase("fixation"):
+                show_stim(fixation, config["fixation_time"], clock, win)
 
         draw_stim_list(extra_text, True)
         win.callOnFlip(clock.reset)
         win.callOnFlip(event.clearEvents)
 
         win.callOnFlip(TRIGGERS.send_trigger, TriggerTypes.GRAPH)
-        show_stim(trial["stimulus_no_numbers"], config["stimulus_time"], clock, win)
+        with profiler.phase("stimulus"):
+            show_stim(trial["stimulus_no_numbers"], config["stimulus_time"], clock, win)
         clock.reset()
 
         win.callOnFlip(TRIGGERS.send_trigger, TriggerTypes.NUMBERS)
-        # draw trial for answers_type == keyboard
-        if config["answers_type"] == "keyboard":
-            while clock.getTime() < config["answer_time"]:
-                trial["stimulus_with_numbers"].draw()
-                show_clock(clock_image, clock, config)
-                show_timer(timer, clock, config)
-
-                answer = event.getKeys(keyList=config["reaction_keys"])
-                if answer:
-                    reaction_time = clock.getTime()
-                    TRIGGERS.send_trigger(TriggerTypes.ANSWER)
-                    answer = answer[0]
-                    break
-                check_exit()
-                win.flip()
-
-        # draw trial for answer_type == mouse
-        elif config["answers_type"] == "mouse":
-            draw_stim_list(answers_buttons.values(), True)
-            while clock.getTime() < config["answer_time"] and answer == "":
-                trial["stimulus_with_numbers"].draw()
-                show_clock(clock_image, clock, config)
-                show_timer(timer, clock, config)
-                for k, ans_button in answers_buttons.items():
-                    if mouse.isPressedIn(ans_button):
+        with profiler.phase("answer"):
+            # draw trial for answers_type == keyboard
+            if config["answers_type"] == "keyboard":
+                while clock.getTime() < config["answer_time"]:
+                    trial["stimulus_with_numbers"].draw()
+                    show_clock(clock_image, clock, config)
+                    show_timer(timer, clock, config)
+
+                    answer = event.getKeys(keyList=config["reaction_keys"])
+                    if answer:
+                        reaction_time = clock.getTime()
+                        TRIGGERS.send_trigger(TriggerTypes.ANSWER)
+                        answer = answer[0]
+                        break
+                    check_exit()
+                    win.flip()
+
+            # draw trial for answer_type == mouse
+            elif config["answers_type"] == "mouse":
+                draw_stim_list(answers_buttons.values(), True)
+                while clock.getTime() < config["answer_time"] and answer == "":
+                    trial["stimulus_with_numbers"].draw()
+                    show_clock(clock_image, clock, config)
+                    show_timer(timer, clock, config)
+                    for k, ans_button in answers_buttons.items():
+                        if mouse.isPressedIn(ans_button):
+                            reaction_time = clock.getTime()
+                            TRIGGERS.send_trigger(TriggerTypes.ANSWER)
+                            answer = str(k)
+                            break
+                        elif ans_button.contains(mouse):
+                            ans_button.borderWidth = config["answer_box_width"]
+                        else:
+                            ans_button.borderWidth = 0
+                    check_exit()
+                    win.flip()
+                draw_stim_list(answers_buttons.values(), False)
+            elif config["answers_type"] == "text":
+                if config["text_box_text_type"] == "integer":
+                    allowed_keys = list(string.digits)
+                elif config["text_box_text_type"] == "letters":
+                    allowed_keys = list(string.ascii_lowercase) + list(string.ascii_uppercase)
+                elif config["text_box_text_type"] == "custom":
+                    allowed_keys = config["text_box_symbols"]
+                else:
+                    raise Exception("Wrong text_box_symbols in config. Choose from letters, integer, or custom")
+                while clock.getTime() < config["answer_time"]:
+                    trial["stimulus_with_numbers"].draw()
+                    show_clock(clock_image, clock, config)
+                    show_timer(timer, clock, config)
+                    answers_buttons[1].draw()
+                    answers_buttons[0].setText("".join(answer))
+                    answers_buttons[0].draw()
+
+                    check_exit()
+                    if event.getKeys(['backspace']):
+                        answer = answer[:-1]
+                    elif event.getKeys(config["text_box_accept_key"]):
                         reaction_time = clock.getTime()
                         TRIGGERS.send_trigger(TriggerTypes.ANSWER)
-                        answer = str(k)
                         break
-                    elif ans_button.contains(mouse):
-                        ans_button.borderWidth = config["answer_box_width"]
+                    elif len(answer) < config["text_box_max_elem"]:
+                        for letter in allowed_keys:
+                            if event.getKeys([letter]):
+                                answer += letter
                     else:
-                        ans_button.borderWidth = 0
-                check_exit()
-                win.flip()
-            draw_stim_list(answers_buttons.values(), False)
-        elif config["answers_type"] == "text":
-            if config["text_box_text_type"] == "integer":
-                allowed_keys = list(string.digits)
-            elif config["text_box_text_type"] == "letters":
-                allowed_keys = list(string.ascii_lowercase) + list(string.ascii_uppercase)
-            elif config["text_box_text_type"] == "custom":
-                allowed_keys = config["text_box_symbols"]
+                        event.getKeys()
+                    win.flip()
             else:
-                raise Exception("Wrong text_box_symbols in config. Choose from letters, integer, or custom")
-            while clock.getTime() < config["answer_time"]:
-                trial["stimulus_with_numbers"].draw()
-                show_clock(clock_image, clock, config)
-                show_timer(timer, clock, config)
-                answers_buttons[1].draw()
-                answers_buttons[0].setText("".join(answer))
-                answers_buttons[0].draw()
-
-                check_exit()
-                if event.getKeys(['backspace']):
-                    answer = answer[:-1]
-                elif event.getKeys(config["text_box_accept_key"]):
-                    reaction_time = clock.getTime()
-                    TRIGGERS.send_trigger(TriggerTypes.ANSWER)
-                    break
-                elif len(answer) < config["text_box_max_elem"]:
-                    for letter in allowed_keys:
-                        if event.getKeys([letter]):
-                            answer += letter
-                else:
-                    event.getKeys()
-                win.flip()
-        else:
-            raise Exception("Wrong answers_type in config. Choose from keyboard, mouse, or text")
+                raise Exception("Wrong answers_type in config. Choose from keyboard, mouse, or text")
 
         # cleaning
         draw_stim_list(extra_text, False)
@@ -193,82 +213,121 @@ def block(config, images, block_type, win, fixation, clock, screen_res, answers,
         TRIGGERS.add_info_to_last_trigger(dict(block_type=block_type, acc=acc, stimulus=trial["image_name"]))
 
         if config[f"fdbk_{block_type}"]:
-            show_stim(feedback[acc], config["fdbk_show_time"], clock, win)
+            with profiler.phase("feedback"):
+                show_stim(feedback[acc], config["fdbk_show_time"], clock, win)
 
         wait_time = config["wait_time"] + random.random() * config["wait_jitter"]
-        show_stim(None, wait_time, clock, win)
+        with profiler.phase("wait"):
+            show_stim(None, wait_time, clock, win)
 
     if config["fixation_time"] == -1:
         fixation.setAutoDraw(False)
         win.flip()
 
 
-def main():
-    global PART_ID
-    config = load_config()
-    info, PART_ID = part_info(test=config["procedure_test"])
+def prepare_stimuli(config, win):
+    stimuli = dict()
+    stimuli["clock"] = core.Clock()
+    stimuli["fixation"] = visual.TextBox2(win, color=config["fixation_color"], text=config["fixation_text"],
+                                          letterHeight=config["fixation_size"], pos=config["fixation_pos"],
+                                          alignment="center")
 
-    screen_res = dict(get_screen_res())
-    win = visual.Window(list(screen_res.values()), fullscr=True, units='pix', screen=0, color=config["screen_color"])
-
-    clock = core.Clock()
-    fixation = visual.TextBox2(win, color=config["fixation_color"], text=config["fixation_text"],
-                               letterHeight=config["fixation_size"], pos=config["fixation_pos"],
-                               alignment="center")
-
-    clock_image = visual.ImageStim(win, image=join('images', 'clock.png'), interpolate=True,
-                                   size=config['clock_size'], pos=config['clock_pos'])
+    stimuli["clock_image"] = visual.ImageStim(win, image=join('images', 'clock.png'), interpolate=True,
+                                              size=config['clock_size'], pos=config['clock_pos'])
 
-    timer = visual.TextBox2(win, color=config["timer_color"], text=config["answer_time"],
-                            letterHeight=config["timer_size"], pos=config["timer_pos"], alignment="center")
+    stimuli["timer"] = visual.TextBox2(win, color=config["timer_color"], text=config["answer_time"],
+                                       letterHeight=config["timer_size"], pos=config["timer_pos"], alignment="center")
 
-    extra_text = [visual.TextBox2(win, color=text["color"], text=text["text"], letterHeight=text["size"],
-                                  pos=text["pos"], alignment="center")
-                  for text in config["extra_text_to_show"]]
+    stimuli["extra_text"] = [visual.TextBox2(win, color=text["color"], text=text["text"], letterHeight=text["size"],
+                                             pos=text["pos"], alignment="center")
+                             for text in config["extra_text_to_show"]]
 
     if config["answers_type"] == "mouse":
-        mouse = event.Mouse(visible=True)
-        answers_buttons = {i: visual.ButtonStim(win, color=config["answer_color"], text=config["answer_symbols"][i],
-                                                letterHeight=config["answer_size"], pos=config["answer_pos"][i],
-                                                borderColor=config["answer_box_color"], borderWidth=0,
-                                                size=config["answer_box_size"], fillColor=config["answer_fill_color"])
-                           for i in config["answer_symbols"]}
+        stimuli["mouse"] = event.Mouse(visible=True)
+        stimuli["answers_buttons"] = {i: visual.ButtonStim(win, color=config["answer_color"],
+                                                           text=config["answer_symbols"][i],
+                                                           letterHeight=config["answer_size"],
+                                                           pos=config["answer_pos"][i],
+                                                           borderColor=config["answer_box_color"], borderWidth=0,
+                                                           size=config["answer_box_size"],
+                                                           fillColor=config["answer_fill_color"])
+                                      for i in config["answer_symbols"]}
     elif config["answers_type"] == "text":
-        mouse = event.Mouse(visible=False)
-        answers_buttons = [visual.TextBox2(win, color=config["text_box_text_color"], pos=config["text_box_pos"],
-                                           letterHeight=config["text_box_text_size"], text="", alignment="center"),
-                           visual.Rect(win, pos=config["text_box_pos"], height=config["text_box_height"],
-                                       width=config["text_box_width"],
-                                       fillColor=config["text_box_fill_color"],
-                                       lineColor=config["text_box_line_color"],
-                                       lineWidth=config["text_box_line_width"])]
+        stimuli["mouse"] = event.Mouse(visible=False)
+        stimuli["answers_buttons"] = [visual.TextBox2(win, color=config["text_box_text_color"],
+                                                      pos=config["text_box_pos"],
+                                                      letterHeight=config["text_box_text_size"], text="",
+                                                      alignment="center"),
+                                      visual.Rect(win, pos=config["text_box_pos"], height=config["text_box_height"],
+                                                  width=config["text_box_width"],
+                                                  fillColor=config["text_box_fill_color"],
+                                                  lineColor=config["text_box_line_color"],
+                                                  lineWidth=config["text_box_line_width"])]
     else:
-        mouse = event.Mouse(visible=False)
-        answers_buttons = None
+        stimuli["mouse"] = event.Mouse(visible=False)
+        stimuli["answers_buttons"] = None
 
     feedback_text = (config["fdbk_incorrect"], config["fdbk_no_answer"], config["fdbk_correct"])
-    feedback = {i: visual.TextBox2(win, color=config["fdbk_color"], text=text, letterHeight=config["fdbk_size"],
-                                   alignment="center")
-                for (i, text) in zip([0, -1, 1], feedback_text)}
+    stimuli["feedback"] = {i: visual.TextBox2(win, color=config["fdbk_color"], text=text,
+                                              letterHeight=config["fdbk_size"], alignment="center")
+                           for (i, text) in zip([0, -1, 1], feedback_text)}
 
     # load data and prepare trials
-    answers = pd.read_csv(join("images", "answers.csv"))
-    training_images, experimental_images = load_images(randomize=config["randomize_trails"])
-    training_images = prepare_block_stimulus(training_images, win, config, folder="training")
-    experimental_images = prepare_block_stimulus(experimental_images, win, config, folder="experiment")
+    stimuli["answers"] = pd.read_csv(join("images", "answers.csv"))
+    training_images, experimental_images = load_images(randomize=config["randomize_trails"],
+                                                        stimulus_dir=config["stimulus_dir"])
+    stimuli["training"] = prepare_block_stimulus(training_images, win, config, folder="training",
+                                                 stimulus_dir=config["stimulus_dir"])
+    stimuli["experiment"] = prepare_block_stimulus(experimental_images, win, config, folder="experiment",
+                                                   stimulus_dir=config["stimulus_dir"])
+    return stimuli
 
+
+def run_session(config, win, screen_res, stimuli):
     # run blocks
-    block(config=config, images=training_images, block_type="training", win=win, fixation=fixation, mouse=mouse,
-          clock=clock, screen_res=screen_res, answers=answers, answers_buttons=answers_buttons, feedback=feedback,
-          extra_text=extra_text, clock_image=clock_image, timer=timer)
-    block(config=config, images=experimental_images, block_type="experiment", win=win, fixation=fixation, mouse=mouse,
-          clock=clock, screen_res=screen_res, answers=answers, answers_buttons=answers_buttons, feedback=feedback,
-          extra_text=extra_text, clock_image=clock_image, timer=timer)
+    for block_type in ["training", "experiment"]:
+        with BlockProfiler(config, block_type, SESSION_NAME) as profiler:
+            block(config=config, images=stimuli[block_type], block_type=block_type, win=win,
+                  fixation=stimuli["fixation"], mouse=stimuli["mouse"], clock=stimuli["clock"],
+                  screen_res=screen_res, answers=stimuli["answers"], answers_buttons=stimuli["answers_buttons"],
+                  feedback=stimuli["feedback"], extra_text=stimuli["extra_text"],
+                  clock_image=stimuli["clock_image"], timer=stimuli["timer"], profiler=profiler)
 
     # end info
     show_info(win, join('.', 'messages', f'end.txt'), text_color=config["text_color"],
               text_size=config["text_size"], screen_res=screen_res)
 
 
+def main():
+    config = load_config()
+    check_profiling_config(config)
+    info, part_id = part_info(test=config["procedure_test"])
+    new_session(part_id)
+
+    screen_res = dict(get_screen_res())
+    win = visual.Window(list(screen_res.values()), fullscr=True, units='pix', screen=0, color=config["screen_color"])
+    stimuli = prepare_stimuli(config, win)
+
+    kiosk_mode = config["kiosk_mode"]
+    if kiosk_mode and config["procedure_test"]:
+        logging.warning('kiosk_mode is ignored when procedure_test is set (no participant dialog).')
+        kiosk_mode = False
+
+    run_session(config, win, screen_res, stimuli)
+    # kiosk mode: window and stimuli are reused, cancelling participant dialog ends the procedure
+    while kiosk_mode:
+        save_beh_results()
+        next_part = next_part_info(win)
+        if next_part is None:
+            break
+        info, part_id = next_part
+        new_session(part_id)
+        if config["randomize_trails"]:
+            random.shuffle(stimuli["training"])
+            random.shuffle(stimuli["experiment"])
+        run_session(config, win, screen_res, stimuli)
+    win.close()
+
+
 if __name__ == "__main__":
     main()